@@ -8,10 +8,16 @@ import streamlit as st
 import requests
 from requests.auth import HTTPBasicAuth
 import pandas as pd
+import numpy as np
+import sys
+from array import array
 from datetime import datetime, timezone
+import re
 import time
+import threading
 import traceback
 import psycopg
+from psycopg import sql
 from psycopg.rows import dict_row
 from psycopg_pool import ConnectionPool
 
@@ -22,6 +28,14 @@ st.set_page_config(
 )
 
 WAREHOUSE_NAME = "Eroilor 19 cv"
+DEFAULT_STORE_ID = "default"
+STORE_ID_PATTERN = re.compile(r"^[a-z0-9_]{1,40}$")
+STORE_REQUIRED_KEYS = ("url", "consumer_key", "consumer_secret")
+POOL_MAX_SIZE = 10
+WOO_REQUEST_INTERVAL = 0.1
+SYNC_CONN_TIMEOUT = 30
+READ_CONN_TIMEOUT = 2
+PARTITION_LOCK_TIMEOUT = "2s"
 
 # ═══════════════════════════════════════════════════════════════════════════
 # CONNECTION POOL POSTGRESQL
@@ -32,28 +46,369 @@ def get_connection_pool():
     """Creează connection pool PostgreSQL"""
     try:
         conninfo = f"host={st.secrets['postgresql']['host']} port={st.secrets['postgresql']['port']} dbname={st.secrets['postgresql']['database']} user={st.secrets['postgresql']['user']} password={st.secrets['postgresql']['password']}"
-        connection_pool = ConnectionPool(conninfo, min_size=1, max_size=10)
+        connection_pool = ConnectionPool(conninfo, min_size=1, max_size=POOL_MAX_SIZE)
         return connection_pool
     except Exception as e:
         st.error(f"Eroare connection pool: {e}")
         return None
 
-def get_db_connection():
-    """Obține conexiune din pool"""
+def get_db_connection(store_id=None, for_sync=False):
+    """Obține conexiune din pool (contorizată în plafonul comun, dacă e dat store_id).
+
+    Sincronizările așteaptă un loc liber cel mult SYNC_CONN_TIMEOUT; citirile scurte
+    (header, rapoarte, Info) renunță după READ_CONN_TIMEOUT.
+    """
     pool = get_connection_pool()
     if pool:
+        coordinator = get_store_coordinator()
+        if store_id and not coordinator.acquire_conn_slot(SYNC_CONN_TIMEOUT if for_sync else READ_CONN_TIMEOUT):
+            st.error(f"Eroare conexiune: nu există conexiune liberă pentru magazinul '{store_id}'")
+            return None
         try:
             return pool.getconn()
         except Exception as e:
+            if store_id:
+                coordinator.release_conn_slot()
             st.error(f"Eroare conexiune: {e}")
             return None
     return None
 
-def release_db_connection(conn):
+def release_db_connection(conn, store_id=None):
     """Returnează conexiunea în pool"""
     pool = get_connection_pool()
     if pool and conn:
         pool.putconn(conn)
+        if store_id:
+            get_store_coordinator().release_conn_slot()
+
+# ═══════════════════════════════════════════════════════════════════════════
+# MULTI-STORE - CREDENȚIALE, PARTIȚII, ÎMPĂRȚIRE RESURSE
+# ═══════════════════════════════════════════════════════════════════════════
+
+class StoreCoordinator:
+    """Coordonează magazinele: o sincronizare per magazin, plafon comun de conexiuni, buget HTTP comun.
+
+    Pentru același magazin se permite o singură sincronizare la un moment dat, iar o
+    sincronizare ține cel mult o conexiune odată. Conexiunile contorizate (ale tuturor
+    magazinelor) nu depășesc POOL_MAX_SIZE; cine nu găsește loc renunță după timeout.
+    Request-urile WooCommerce trec printr-o poartă comună: două request-uri (din orice
+    magazin) pornesc la cel puțin `request_interval` secunde distanță, în ordinea sosirii,
+    deci rata totală nu depășește 1 / request_interval, oricât de lente sunt răspunsurile.
+    """
+
+    def __init__(self, pool_size, request_interval):
+        self._pool_size = pool_size
+        self._request_interval = request_interval
+        self._cond = threading.Condition()
+        self._conns_in_use = 0
+        self._syncing = set()
+        self._next_request_at = 0.0
+
+    def acquire_conn_slot(self, timeout=SYNC_CONN_TIMEOUT):
+        with self._cond:
+            acquired = self._cond.wait_for(lambda: self._conns_in_use < self._pool_size, timeout)
+            if acquired:
+                self._conns_in_use += 1
+            return acquired
+
+    def release_conn_slot(self):
+        with self._cond:
+            self._conns_in_use = max(0, self._conns_in_use - 1)
+            self._cond.notify()
+
+    def begin_sync(self, store_id):
+        with self._cond:
+            if store_id in self._syncing:
+                return False
+            self._syncing.add(store_id)
+            return True
+
+    def end_sync(self, store_id):
+        with self._cond:
+            self._syncing.discard(store_id)
+
+    def wait_http_turn(self):
+        """Rezervă următorul slot din bugetul HTTP comun și așteaptă până la el (apel înainte de request)"""
+        with self._cond:
+            now = time.monotonic()
+            start = max(now, self._next_request_at)
+            self._next_request_at = start + self._request_interval
+        if start > now:
+            time.sleep(start - now)
+
+@st.cache_resource
+def get_store_coordinator():
+    """Coordonator comun tuturor sesiunilor Streamlit"""
+    return StoreCoordinator(POOL_MAX_SIZE, WOO_REQUEST_INTERVAL)
+
+def get_woo_stores():
+    """Citește magazinele WooCommerce din secrets ([woocommerce.stores.<id>] sau [woocommerce] simplu)"""
+    stores = {}
+    woo_secrets = st.secrets["woocommerce"]
+    
+    if "stores" in woo_secrets:
+        for store_id, cfg in woo_secrets["stores"].items():
+            if not STORE_ID_PATTERN.match(store_id):
+                st.warning(f"⚠️ ID magazin invalid ignorat: '{store_id}' (doar a-z, 0-9, _)")
+                continue
+            missing = [key for key in STORE_REQUIRED_KEYS if not cfg.get(key)]
+            if missing:
+                st.warning(f"⚠️ Magazin '{store_id}' ignorat: lipsesc {', '.join(missing)}")
+                continue
+            stores[store_id] = {
+                'name': cfg.get('name', store_id),
+                'url': cfg['url'],
+                'consumer_key': cfg['consumer_key'],
+                'consumer_secret': cfg['consumer_secret'],
+                'warehouse': cfg.get('warehouse', WAREHOUSE_NAME)
+            }
+    else:
+        stores[DEFAULT_STORE_ID] = {
+            'name': "WooCommerce",
+            'url': woo_secrets['url'],
+            'consumer_key': woo_secrets['consumer_key'],
+            'consumer_secret': woo_secrets['consumer_secret'],
+            'warehouse': WAREHOUSE_NAME
+        }
+    
+    return stores
+
+class LegacySchemaError(RuntimeError):
+    """public.woocommerce_stock există încă în formatul vechi (nepartiționat)"""
+
+@st.cache_resource
+def ensure_store_partition(store_id):
+    """Creează tabela partiționată și partiția magazinului (o singură dată per proces).
+
+    Partiția nouă e creată ca tabelă separată și apoi atașată cu ATTACH PARTITION, care ia
+    pe tabela părinte doar SHARE UPDATE EXCLUSIVE, deci nu blochează citirile și
+    sincronizările celorlalte magazine. Cu lock_timeout, DDL-ul eșuează rapid
+    (psycopg.errors.LockNotAvailable) în loc să țină alte sesiuni la coadă.
+    """
+    conn = get_db_connection()
+    if not conn:
+        raise RuntimeError("Nu pot obține conexiune PostgreSQL!")
+    
+    partition = sql.Identifier("public", f"woocommerce_stock_{store_id}")
+    try:
+        cursor = conn.cursor()
+        cursor.execute(sql.SQL("SET LOCAL lock_timeout = {}").format(sql.Literal(PARTITION_LOCK_TIMEOUT)))
+        cursor.execute("""
+            SELECT c.relkind
+            FROM pg_class c
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE n.nspname = 'public' AND c.relname = 'woocommerce_stock'
+        """)
+        row = cursor.fetchone()
+        if row and row[0] != 'p':
+            raise LegacySchemaError(
+                "Tabela public.woocommerce_stock este în formatul vechi (fără store_id, nepartiționată). "
+                "Rulează SQL-ul din README → Multi-store → Migrare de la tabela veche."
+            )
+        
+        if row is None:
+            cursor.execute("""
+                CREATE TABLE public.woocommerce_stock (
+                    store_id text NOT NULL,
+                    sku text NOT NULL,
+                    stock_quantity numeric NOT NULL DEFAULT 0,
+                    stock_status text,
+                    product_type text,
+                    woo_product_id bigint,
+                    last_synced_at timestamptz,
+                    PRIMARY KEY (store_id, sku)
+                ) PARTITION BY LIST (store_id)
+            """)
+        cursor.execute("""
+            SELECT 1
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            JOIN pg_namespace n ON n.oid = c.relnamespace
+            WHERE i.inhparent = 'public.woocommerce_stock'::regclass
+              AND n.nspname = 'public' AND c.relname = %s
+        """, (f"woocommerce_stock_{store_id}",))
+        if not cursor.fetchone():
+            cursor.execute(
+                sql.SQL("CREATE TABLE {} (LIKE public.woocommerce_stock INCLUDING ALL)").format(partition)
+            )
+            cursor.execute(
+                sql.SQL("ALTER TABLE public.woocommerce_stock ATTACH PARTITION {} FOR VALUES IN ({})").format(
+                    partition, sql.Literal(store_id)
+                )
+            )
+        conn.commit()
+        cursor.close()
+        return True
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
+
+def run_store_sync(sync_func, store_id, *args):
+    """Rulează o sincronizare, cel mult una simultan per magazin"""
+    coordinator = get_store_coordinator()
+    if not coordinator.begin_sync(store_id):
+        st.warning(f"⏳ O sincronizare pentru magazinul '{store_id}' este deja în curs")
+        return False
+    try:
+        return sync_func(store_id, *args)
+    finally:
+        coordinator.end_sync(store_id)
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SNAPSHOT SKU COLUMNAR
+# ═══════════════════════════════════════════════════════════════════════════
+
+class SkuSnapshotBuilder:
+    """Acumulează date per SKU în coloane compacte (array) în loc de un dict per SKU.
+
+    Un SKU adăugat din nou suprascrie rândul existent (ultimul câștigă).
+    stock_status și product_type sunt stocate ca coduri int8.
+    După build() snapshot-ul partajează bufferele builder-ului, deci builder-ul nu mai
+    acceptă add().
+    """
+
+    def __init__(self):
+        self._built = False
+        self._rows = {}
+        self._stock = array('d')
+        self._product_id = array('q')
+        self._status = array('b')
+        self._product_type = array('b')
+        self._names = []
+        self._status_codes = {}
+        self._type_codes = {}
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, sku):
+        return sku in self._rows
+
+    def product_id(self, sku):
+        value = self._product_id[self._rows[sku]]
+        return None if value < 0 else value
+
+    @staticmethod
+    def _encode(codes, value):
+        if value is None:
+            return -1
+        code = codes.get(value)
+        if code is None:
+            if len(codes) >= 127:
+                raise ValueError(f"Prea multe categorii distincte: {value!r}")
+            code = codes[value] = len(codes)
+        return code
+
+    def add(self, sku, stock=0.0, status=None, product_type=None, product_id=None, name=None):
+        if self._built:
+            raise RuntimeError("SkuSnapshotBuilder nu mai acceptă add() după build()")
+        status_code = self._encode(self._status_codes, status)
+        type_code = self._encode(self._type_codes, product_type)
+        pid = -1 if product_id is None else product_id
+        
+        row = self._rows.get(sku)
+        if row is None:
+            self._rows[sys.intern(sku)] = len(self._stock)
+            self._stock.append(stock)
+            self._product_id.append(pid)
+            self._status.append(status_code)
+            self._product_type.append(type_code)
+            self._names.append(name)
+        else:
+            self._stock[row] = stock
+            self._product_id[row] = pid
+            self._status[row] = status_code
+            self._product_type[row] = type_code
+            self._names[row] = name
+
+    @staticmethod
+    def _frozen(values, dtype):
+        arr = np.frombuffer(values, dtype=dtype) if len(values) else np.empty(0, dtype=dtype)
+        arr.flags.writeable = False
+        return arr
+
+    def build(self):
+        self._built = True
+        names = None
+        if any(n is not None for n in self._names):
+            names = np.array(self._names, dtype=object)
+            names.flags.writeable = False
+        return SkuSnapshot(
+            skus=pd.Index(list(self._rows), dtype=object),
+            stock=self._frozen(self._stock, np.float64),
+            product_id=self._frozen(self._product_id, np.int64),
+            status=self._frozen(self._status, np.int8),
+            product_type=self._frozen(self._product_type, np.int8),
+            status_categories=tuple(self._status_codes),
+            type_categories=tuple(self._type_codes),
+            names=names
+        )
+
+class SkuSnapshot:
+    """Snapshot imutabil per SKU: index hash (lookup O(1)), cantități float64, coduri int8."""
+
+    __slots__ = ('skus', 'stock', 'product_id', 'status', 'product_type', 'status_categories', 'type_categories', 'names')
+
+    def __init__(self, skus, stock, product_id, status, product_type, status_categories, type_categories, names=None):
+        self.skus = skus
+        self.stock = stock
+        self.product_id = product_id
+        self.status = status
+        self.product_type = product_type
+        self.status_categories = status_categories
+        self.type_categories = type_categories
+        self.names = names
+
+    @classmethod
+    def empty(cls):
+        return SkuSnapshotBuilder().build()
+
+    def __len__(self):
+        return len(self.skus)
+
+    def __contains__(self, sku):
+        return sku in self.skus
+
+    def positions(self, skus):
+        """Poziția fiecărui SKU din `skus` în snapshot (-1 dacă lipsește)"""
+        return self.skus.get_indexer(skus)
+
+    def stock_for(self, skus):
+        """Stocul pentru fiecare SKU din `skus` (0 dacă lipsește)"""
+        pos = self.positions(skus)
+        if not len(self):
+            return np.zeros(len(pos), dtype=np.float64)
+        return np.where(pos >= 0, self.stock[pos], 0.0)
+
+    def _decode(self, categories, codes):
+        return pd.Categorical.from_codes(codes, categories=list(categories))
+
+    def stock_status_values(self):
+        return self._decode(self.status_categories, self.status)
+
+    def product_type_values(self):
+        return self._decode(self.type_categories, self.product_type)
+
+    def rows(self):
+        """Iterează (sku, stock, stock_status, product_type, product_id) pentru scrieri în DB"""
+        status_lookup = self.status_categories + (None,)
+        type_lookup = self.type_categories + (None,)
+        for sku, stock, status, ptype, pid in zip(self.skus, self.stock.tolist(), self.status.tolist(), self.product_type.tolist(), self.product_id.tolist()):
+            yield sku, stock, status_lookup[status], type_lookup[ptype], (None if pid < 0 else pid)
+
+    def to_frame(self):
+        df = pd.DataFrame({
+            'stock': self.stock,
+            'stock_status': self.stock_status_values(),
+            'product_type': self.product_type_values(),
+            'product_id': pd.arrays.IntegerArray(self.product_id, self.product_id < 0)
+        }, index=self.skus)
+        if self.names is not None:
+            df['name'] = self.names
+        df.index.name = 'sku'
+        return df
 
 # ═══════════════════════════════════════════════════════════════════════════
 # SIDEBAR - CONFIGURĂRI + DEBUG
@@ -79,11 +434,22 @@ with st.sidebar:
     # WooCommerce
     st.subheader("🟢 WooCommerce")
     try:
-        woo_url = st.secrets["woocommerce"]["url"]
-        woo_key = st.secrets["woocommerce"]["consumer_key"]
-        woo_secret = st.secrets["woocommerce"]["consumer_secret"]
-        st.success("✅ WooCommerce")
+        woo_stores = get_woo_stores()
+        if "stores" in st.secrets["woocommerce"] and not woo_stores:
+            st.warning("⚠️ Niciun magazin WooCommerce complet configurat în secrets")
     except:
+        woo_stores = {}
+    
+    if woo_stores:
+        store_id = st.selectbox("Magazin", list(woo_stores), format_func=lambda s: woo_stores[s]['name'])
+        woo_url = woo_stores[store_id]['url']
+        woo_key = woo_stores[store_id]['consumer_key']
+        woo_secret = woo_stores[store_id]['consumer_secret']
+        warehouse_name = woo_stores[store_id]['warehouse']
+        st.success(f"✅ WooCommerce ({len(woo_stores)} magazine)")
+    else:
+        store_id = DEFAULT_STORE_ID
+        warehouse_name = WAREHOUSE_NAME
         woo_url = st.text_input("URL")
         woo_key = st.text_input("Consumer Key", type="password")
         woo_secret = st.text_input("Consumer Secret", type="password")
@@ -97,11 +463,21 @@ with st.sidebar:
         if test_conn:
             test_conn.close()
             release_db_connection(test_conn)
+            ensure_store_partition(store_id)
             st.success("✅ PostgreSQL OK")
             db_connected = True
         else:
             st.error("❌ Eroare PostgreSQL")
             db_connected = False
+    except LegacySchemaError as e:
+        st.error(f"❌ Migrare necesară: {e}")
+        db_connected = False
+    except psycopg.errors.LockNotAvailable:
+        st.error(f"❌ Partiția pentru magazinul '{store_id}' nu a putut fi creată: tabela este blocată momentan. Reîncarcă pagina în câteva secunde.")
+        db_connected = False
+    except psycopg.Error as e:
+        st.error(f"❌ Eroare partiție magazin: {e}")
+        db_connected = False
     except:
         st.error("❌ Configurare lipsă!")
         db_connected = False
@@ -111,15 +487,15 @@ with st.sidebar:
     
     if st.button("🔍 Verifică Tabele", use_container_width=True):
         if db_connected:
-            conn = get_db_connection()
+            conn = get_db_connection(store_id)
             if conn:
                 try:
                     cursor = conn.cursor(row_factory=dict_row)
-                    cursor.execute("SELECT COUNT(*) as count FROM public.woocommerce_stock")
+                    cursor.execute("SELECT COUNT(*) as count FROM public.woocommerce_stock WHERE store_id = %s", (store_id,))
                     count = cursor.fetchone()['count']
                     st.metric("Total Rânduri", count)
                     
-                    cursor.execute("SELECT * FROM public.woocommerce_stock LIMIT 5")
+                    cursor.execute("SELECT * FROM public.woocommerce_stock WHERE store_id = %s LIMIT 5", (store_id,))
                     sample = cursor.fetchall()
                     if sample:
                         st.dataframe(pd.DataFrame(sample))
@@ -129,7 +505,7 @@ with st.sidebar:
                 except Exception as e:
                     st.error(f"❌ Eroare: {e}")
                 finally:
-                    release_db_connection(conn)
+                    release_db_connection(conn, store_id)
 
     if st.button("🧪 Test WooCommerce API", use_container_width=True):
         if all([woo_url, woo_key, woo_secret]):
@@ -144,7 +520,7 @@ with st.sidebar:
 
     if st.button("📊 Info Database", use_container_width=True):
         if db_connected:
-            conn = get_db_connection()
+            conn = get_db_connection(store_id)
             if conn:
                 try:
                     cursor = conn.cursor(row_factory=dict_row)
@@ -155,7 +531,8 @@ with st.sidebar:
                             COUNT(*) FILTER (WHERE stock_status = 'outofstock') as out_of_stock,
                             SUM(stock_quantity) as total_qty
                         FROM public.woocommerce_stock
-                    """)
+                        WHERE store_id = %s
+                    """, (store_id,))
                     stats = cursor.fetchone()
                     
                     col1, col2 = st.columns(2)
@@ -164,19 +541,19 @@ with st.sidebar:
                         st.metric("În Stoc", stats['in_stock'])
                     with col2:
                         st.metric("Fără Stoc", stats['out_of_stock'])
-                        st.metric("Cantitate", f"{stats['total_qty']:.0f}")
+                        st.metric("Cantitate", f"{stats['total_qty'] or 0:.0f}")
                     
                     cursor.close()
                 except Exception as e:
                     st.error(f"❌ Eroare: {e}")
                 finally:
-                    release_db_connection(conn)
+                    release_db_connection(conn, store_id)
 
 # ═══════════════════════════════════════════════════════════════════════════
 # FUNCȚII PRINCIPALE
 # ═══════════════════════════════════════════════════════════════════════════
 
-def update_stocks_only(woo_url, woo_key, woo_secret):
+def update_stocks_only(store_id, woo_url, woo_key, woo_secret):
     """Update rapid stocuri pentru produse existente"""
     st.markdown("---")
     st.subheader("⚡ Update Rapid Stocuri")
@@ -185,91 +562,97 @@ def update_stocks_only(woo_url, woo_key, woo_secret):
         progress_bar = st.progress(0)
         status_text = st.empty()
         
-        conn = get_db_connection()
+        conn = get_db_connection(store_id)
         if not conn:
             st.error("❌ Nu pot obține conexiune PostgreSQL!")
             return False
         
         try:
             cursor = conn.cursor()
-            cursor.execute("SELECT sku FROM public.woocommerce_stock")
+            cursor.execute("SELECT sku FROM public.woocommerce_stock WHERE store_id = %s", (store_id,))
             existing_skus = set(row[0] for row in cursor.fetchall())
             cursor.close()
-            
-            st.info(f"📦 {len(existing_skus)} SKU-uri în baza de date")
-            progress_bar.progress(0.2)
-            
-            status_text.text("📥 Preluare stocuri din WooCommerce...")
-            stock_dict = {}
-            page = 1
-            
-            while True:
-                try:
-                    response = requests.get(
-                        f"{woo_url}/wp-json/wc/v3/products",
-                        auth=(woo_key, woo_secret),
-                        params={"per_page": 100, "page": page, "status": "publish", "_fields": "sku,stock_quantity,stock_status"},
-                        timeout=30
-                    )
-                    
-                    if response.status_code != 200:
-                        break
-                    
-                    products = response.json()
-                    if not products:
-                        break
-                    
-                    for p in products:
-                        sku = p.get('sku', '').strip()
-                        if sku and sku in existing_skus:
-                            stock_dict[sku] = {
-                                'stock_quantity': float(p.get('stock_quantity') or 0),
-                                'stock_status': p.get('stock_status', 'outofstock'),
-                                'last_synced_at': datetime.now(timezone.utc)
-                            }
-                    
-                    status_text.text(f"📥 {len(stock_dict)} stocuri actualizate (pagina {page})...")
-                    page += 1
-                    time.sleep(0.1)
-                    
-                except Exception as e:
-                    st.warning(f"Eroare pagina {page}: {e}")
-                    break
-            
-            progress_bar.progress(0.8)
-            
-            if stock_dict:
-                status_text.text(f"💾 Salvare {len(stock_dict)} actualizări...")
+        finally:
+            release_db_connection(conn, store_id)
+        
+        st.info(f"📦 {len(existing_skus)} SKU-uri în baza de date")
+        progress_bar.progress(0.2)
+        
+        status_text.text("📥 Preluare stocuri din WooCommerce...")
+        stock_builder = SkuSnapshotBuilder()
+        page = 1
+        
+        while True:
+            try:
+                get_store_coordinator().wait_http_turn()
+                response = requests.get(
+                    f"{woo_url}/wp-json/wc/v3/products",
+                    auth=(woo_key, woo_secret),
+                    params={"per_page": 100, "page": page, "status": "publish", "_fields": "sku,stock_quantity,stock_status"},
+                    timeout=30
+                )
                 
-                cursor = conn.cursor()
-                update_query = "UPDATE public.woocommerce_stock SET stock_quantity = %s, stock_status = %s, last_synced_at = %s WHERE sku = %s"
-                update_data = [(v['stock_quantity'], v['stock_status'], v['last_synced_at'], k) for k, v in stock_dict.items()]
+                if response.status_code != 200:
+                    break
                 
-                cursor.executemany(update_query, update_data)
-                conn.commit()
+                products = response.json()
+                if not products:
+                    break
                 
-                updated = cursor.rowcount
-                cursor.close()
+                for p in products:
+                    sku = p.get('sku', '').strip()
+                    if sku and sku in existing_skus:
+                        stock_builder.add(sku, float(p.get('stock_quantity') or 0), p.get('stock_status', 'outofstock'))
                 
-                progress_bar.progress(1.0)
-                time.sleep(0.3)
-                progress_bar.empty()
-                status_text.empty()
-                st.success(f"✅ {updated} stocuri actualizate!")
-                return True
-            else:
-                st.warning("⚠️ Nu s-au găsit stocuri de actualizat")
-                return False
+                status_text.text(f"📥 {len(stock_builder)} stocuri actualizate (pagina {page})...")
+                page += 1
                 
+            except Exception as e:
+                st.warning(f"Eroare pagina {page}: {e}")
+                break
+        
+        progress_bar.progress(0.8)
+        stock_snapshot = stock_builder.build()
+        del stock_builder
+        
+        if not stock_snapshot:
+            st.warning("⚠️ Nu s-au găsit stocuri de actualizat")
+            return False
+        
+        status_text.text(f"💾 Salvare {len(stock_snapshot)} actualizări...")
+        
+        conn = get_db_connection(store_id, for_sync=True)
+        if not conn:
+            st.error("❌ Nu pot obține conexiune PostgreSQL!")
+            return False
+        
+        try:
+            cursor = conn.cursor()
+            update_query = "UPDATE public.woocommerce_stock SET stock_quantity = %s, stock_status = %s, last_synced_at = %s WHERE store_id = %s AND sku = %s"
+            synced_at = datetime.now(timezone.utc)
+            update_data = ((stock, status, synced_at, store_id, sku) for sku, stock, status, _, _ in stock_snapshot.rows())
+            
+            cursor.executemany(update_query, update_data)
+            conn.commit()
+            
+            updated = cursor.rowcount
+            cursor.close()
         finally:
-            release_db_connection(conn)
+            release_db_connection(conn, store_id)
+        
+        progress_bar.progress(1.0)
+        time.sleep(0.3)
+        progress_bar.empty()
+        status_text.empty()
+        st.success(f"✅ {updated} stocuri actualizate!")
+        return True
             
     except Exception as e:
         st.error(f"❌ EROARE: {e}")
         st.code(traceback.format_exc())
         return False
 
-def sync_woocommerce_full(woo_url, woo_key, woo_secret):
+def sync_woocommerce_full(store_id, woo_url, woo_key, woo_secret):
     """Sincronizare completă WooCommerce → PostgreSQL"""
     st.markdown("---")
     st.subheader("🔄 Sincronizare Completă")
@@ -302,6 +685,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
         
         while True:
             try:
+                get_store_coordinator().wait_http_turn()
                 response = requests.get(
                     f"{woo_url}/wp-json/wc/v3/products",
                     auth=(woo_key, woo_secret),
@@ -322,7 +706,6 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
                     status_text.text(f"📥 {len(products_data)} produse (pagina {page})...")
                 
                 page += 1
-                time.sleep(0.1)
                 
             except:
                 break
@@ -355,6 +738,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
                 
                 while True:
                     try:
+                        get_store_coordinator().wait_http_turn()
                         vr = requests.get(
                             f"{woo_url}/wp-json/wc/v3/products/{product_id}/variations",
                             auth=(woo_key, woo_secret),
@@ -372,7 +756,6 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
                         all_items.extend(vlist)
                         total_var += len(vlist)
                         vpage += 1
-                        time.sleep(0.05)
                         
                     except:
                         break
@@ -392,7 +775,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
         with log_container:
             log_display.text('\n'.join(log_lines))
         
-        sku_map = {}
+        sku_builder = SkuSnapshotBuilder()
         duplicate_details = []
         
         for item in all_items:
@@ -400,15 +783,22 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
             if not sku:
                 continue
             
-            if sku in sku_map:
-                duplicate_details.append({'sku': sku, 'first_id': sku_map[sku]['id'], 'duplicate_id': item.get('id')})
+            if sku in sku_builder:
+                duplicate_details.append({'sku': sku, 'first_id': sku_builder.product_id(sku), 'duplicate_id': item.get('id')})
             
-            sku_map[sku] = {
-                'id': item.get('id'),
-                'type': item.get('type', 'unknown'),
-                'stock': item.get('stock_quantity'),
-                'status': item.get('stock_status', 'outofstock')
-            }
+            stock = item.get('stock_quantity')
+            sku_builder.add(
+                sku,
+                float(stock) if stock is not None else 0,
+                item.get('stock_status', 'outofstock'),
+                item.get('type', 'unknown'),
+                item.get('id')
+            )
+        
+        sku_map = sku_builder.build()
+        del sku_builder
+        all_items_count = len(all_items)
+        del all_items, products_data, simple, variable
         
         log_lines.append(f"✅ STEP 3: {len(sku_map)} SKU-uri unice, {len(duplicate_details)} duplicate")
         with log_container:
@@ -421,7 +811,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
         with log_container:
             log_display.text('\n'.join(log_lines))
         
-        conn = get_db_connection()
+        conn = get_db_connection(store_id, for_sync=True)
         if not conn:
             st.error("❌ Nu pot obține conexiune PostgreSQL!")
             return False
@@ -429,16 +819,17 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
         try:
             cursor = conn.cursor()
             
-            stock_data = [
-                (sku, float(prod['stock']) if prod['stock'] is not None else 0, prod['status'], prod['type'], prod['id'], datetime.now(timezone.utc))
-                for sku, prod in sku_map.items()
-            ]
+            synced_at = datetime.now(timezone.utc)
+            stock_data = (
+                (store_id, sku, stock, status, product_type, product_id, synced_at)
+                for sku, stock, status, product_type, product_id in sku_map.rows()
+            )
             
             # Upsert manual (psycopg v3)
             upsert_query = """
-                INSERT INTO public.woocommerce_stock (sku, stock_quantity, stock_status, product_type, woo_product_id, last_synced_at)
-                VALUES (%s, %s, %s, %s, %s, %s)
-                ON CONFLICT (sku) DO UPDATE SET
+                INSERT INTO public.woocommerce_stock (store_id, sku, stock_quantity, stock_status, product_type, woo_product_id, last_synced_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s)
+                ON CONFLICT (store_id, sku) DO UPDATE SET
                     stock_quantity = EXCLUDED.stock_quantity,
                     stock_status = EXCLUDED.stock_status,
                     product_type = EXCLUDED.product_type,
@@ -449,7 +840,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
             cursor.executemany(upsert_query, stock_data)
             conn.commit()
             
-            saved = len(stock_data)
+            saved = len(sku_map)
             cursor.close()
             
             end_time = datetime.now()
@@ -469,7 +860,7 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
                 st.success(f"🎉 {saved} produse salvate în {duration//60}m {duration%60}s")
                 
                 col1, col2, col3, col4 = st.columns(4)
-                col1.metric("📦 Produse totale", len(all_items))
+                col1.metric("📦 Produse totale", all_items_count)
                 col2.metric("💾 Salvate", saved)
                 col3.metric("🔄 SKU-uri unice", len(sku_map))
                 col4.metric("⏱️ Timp", f"{duration//60}m {duration%60}s")
@@ -481,33 +872,35 @@ def sync_woocommerce_full(woo_url, woo_key, woo_secret):
             return True
             
         finally:
-            release_db_connection(conn)
+            release_db_connection(conn, store_id)
         
     except Exception as e:
         st.error(f"❌ EROARE: {e}")
         st.code(traceback.format_exc())
         return False
 
-def get_woocommerce_stock_from_db():
-    """Citește toate stocurile din PostgreSQL"""
+def get_woocommerce_stock_from_db(store_id):
+    """Citește stocurile magazinului din PostgreSQL"""
     try:
-        conn = get_db_connection()
+        conn = get_db_connection(store_id)
         if not conn:
-            return {}
+            return SkuSnapshot.empty()
         
         try:
-            cursor = conn.cursor(row_factory=dict_row)
-            cursor.execute("SELECT sku, stock_quantity, stock_status FROM public.woocommerce_stock")
-            rows = cursor.fetchall()
+            cursor = conn.cursor()
+            cursor.execute("SELECT sku, stock_quantity, stock_status FROM public.woocommerce_stock WHERE store_id = %s", (store_id,))
+            builder = SkuSnapshotBuilder()
+            for sku, stock_quantity, stock_status in cursor:
+                builder.add(sku, float(stock_quantity), stock_status)
             cursor.close()
             
-            return {row['sku']: {'stock': float(row['stock_quantity']), 'status': row['stock_status']} for row in rows}
+            return builder.build()
         finally:
-            release_db_connection(conn)
+            release_db_connection(conn, store_id)
             
     except Exception as e:
         st.error(f"Eroare citire PostgreSQL: {e}")
-        return {}
+        return SkuSnapshot.empty()
 
 def get_smartbill_stocks(email, token, cif, warehouse_name):
     """Preluare stocuri din SmartBill"""
@@ -525,9 +918,9 @@ def get_smartbill_stocks(email, token, cif, warehouse_name):
 
 def process_smartbill_data(data):
     """Procesare date SmartBill"""
-    sb_dict = {}
+    builder = SkuSnapshotBuilder()
     if not data:
-        return sb_dict
+        return builder.build()
     
     products = []
     if isinstance(data, dict) and "list" in data:
@@ -540,35 +933,40 @@ def process_smartbill_data(data):
             continue
         code = p.get('productCode', '').strip()
         if code:
-            sb_dict[code] = {'name': p.get('productName', ''), 'stock': float(p.get('quantity', 0))}
+            builder.add(code, float(p.get('quantity', 0)), name=p.get('productName', ''))
     
-    return sb_dict
+    return builder.build()
 
-def generate_discrepancy_report(sb_dict, woo_dict):
+def generate_discrepancy_report(sb_snapshot, woo_snapshot):
     """Generare raport discrepanțe"""
-    disc = []
-    
-    for code, sb in sb_dict.items():
-        if code not in woo_dict and sb['stock'] > 0:
-            disc.append({'SKU': code, 'Denumire': sb['name'][:60], 'Stoc SB': float(sb['stock']), 'Stoc Woo': 0.0, 'Diferență': float(sb['stock']), 'Tip': 'Lipsă în Woo', 'Status': 'CRITIC', 'Prioritate': 1})
+    sb_skus = sb_snapshot.skus
+    sb_stock = sb_snapshot.stock
+    sb_names = pd.Series(sb_snapshot.names if sb_snapshot.names is not None else [''] * len(sb_snapshot), dtype=object).str[:60].to_numpy()
+    woo_in_sb = sb_snapshot.positions(woo_snapshot.skus) >= 0
+    sb_in_woo = woo_snapshot.positions(sb_skus) >= 0
+    woo_stock = woo_snapshot.stock_for(sb_skus)
+    diff = sb_stock - woo_stock
     
-    for code, sb in sb_dict.items():
-        if code in woo_dict and sb['stock'] > 0 and woo_dict[code]['stock'] == 0:
-            disc.append({'SKU': code, 'Denumire': sb['name'][:60], 'Stoc SB': float(sb['stock']), 'Stoc Woo': 0.0, 'Diferență': float(sb['stock']), 'Tip': 'Stoc 0 în Woo', 'Status': 'ATENȚIE', 'Prioritate': 2})
+    def _rows(skus, names, stoc_sb, stoc_woo, diferenta, tip, status, prioritate):
+        return pd.DataFrame({
+            'SKU': skus, 'Denumire': names, 'Stoc SB': stoc_sb, 'Stoc Woo': stoc_woo, 'Diferență': diferenta,
+            'Tip': tip, 'Status': status, 'Prioritate': prioritate
+        }, index=range(len(skus)))
     
-    for code in set(sb_dict.keys()) & set(woo_dict.keys()):
-        sb_stock = sb_dict[code]['stock']
-        woo_stock = woo_dict[code]['stock']
-        diff = sb_stock - woo_stock
-        
-        if abs(diff) > 0.01 and sb_stock > 0:
-            disc.append({'SKU': code, 'Denumire': sb_dict[code]['name'][:60], 'Stoc SB': float(sb_stock), 'Stoc Woo': float(woo_stock), 'Diferență': round(float(diff), 2), 'Tip': 'Diferență', 'Status': 'SYNC', 'Prioritate': 3})
+    missing = ~sb_in_woo & (sb_stock > 0)
+    zero = sb_in_woo & (sb_stock > 0) & (woo_stock == 0)
+    sync = sb_in_woo & (np.abs(diff) > 0.01) & (sb_stock > 0)
+    extra = ~woo_in_sb & (woo_snapshot.stock > 0)
     
-    for code, woo in woo_dict.items():
-        if code not in sb_dict and woo['stock'] > 0:
-            disc.append({'SKU': code, 'Denumire': '', 'Stoc SB': 0.0, 'Stoc Woo': float(woo['stock']), 'Diferență': -float(woo['stock']), 'Tip': 'În Woo nu în SB', 'Status': 'VERIFICARE', 'Prioritate': 4})
+    parts = [
+        _rows(sb_skus[missing], sb_names[missing], sb_stock[missing], 0.0, sb_stock[missing], 'Lipsă în Woo', 'CRITIC', 1),
+        _rows(sb_skus[zero], sb_names[zero], sb_stock[zero], 0.0, sb_stock[zero], 'Stoc 0 în Woo', 'ATENȚIE', 2),
+        _rows(sb_skus[sync], sb_names[sync], sb_stock[sync], woo_stock[sync], np.round(diff[sync], 2), 'Diferență', 'SYNC', 3),
+        _rows(woo_snapshot.skus[extra], '', 0.0, woo_snapshot.stock[extra], -woo_snapshot.stock[extra], 'În Woo nu în SB', 'VERIFICARE', 4)
+    ]
+    parts = [part for part in parts if len(part) > 0]
     
-    df = pd.DataFrame(disc)
+    df = pd.concat(parts, ignore_index=True) if parts else pd.DataFrame()
     if len(df) > 0:
         df = df.sort_values(['Prioritate', 'Stoc SB'], ascending=[True, False])
         df = df.drop('Prioritate', axis=1)
@@ -584,21 +982,21 @@ st.caption("Versiune PostgreSQL DIRECT (psycopg v3) - Optimizat Streamlit Cloud"
 st.markdown("---")
 
 if db_connected:
-    conn = get_db_connection()
+    conn = get_db_connection(store_id)
     if conn:
         try:
             cursor = conn.cursor(row_factory=dict_row)
-            cursor.execute("SELECT COUNT(*) as total FROM public.woocommerce_stock")
+            cursor.execute("SELECT COUNT(*) as total FROM public.woocommerce_stock WHERE store_id = %s", (store_id,))
             total = cursor.fetchone()['total']
             
-            cursor.execute("SELECT last_synced_at FROM public.woocommerce_stock WHERE last_synced_at IS NOT NULL ORDER BY last_synced_at DESC LIMIT 1")
+            cursor.execute("SELECT MAX(last_synced_at) as last_synced_at FROM public.woocommerce_stock WHERE store_id = %s", (store_id,))
             last_sync_row = cursor.fetchone()
             
             col1, col2 = st.columns(2)
             with col1:
                 st.metric("📦 Produse în baza de date", total)
             with col2:
-                if last_sync_row:
+                if last_sync_row['last_synced_at']:
                     st.info(f"📅 Ultima sincronizare: {last_sync_row['last_synced_at']} (UTC)")
                 else:
                     st.info("📅 Nicio sincronizare încă")
@@ -607,7 +1005,7 @@ if db_connected:
         except Exception as e:
             st.error(f"⚠️ Eroare citire info: {e}")
         finally:
-            release_db_connection(conn)
+            release_db_connection(conn, store_id)
 
 st.markdown("---")
 
@@ -626,13 +1024,13 @@ if quick:
     if not db_connected or not all([woo_url, woo_key, woo_secret]):
         st.error("⚠️ Configurează toate serviciile!")
     else:
-        update_stocks_only(woo_url, woo_key, woo_secret)
+        run_store_sync(update_stocks_only, store_id, woo_url, woo_key, woo_secret)
 
 if full:
     if not db_connected or not all([woo_url, woo_key, woo_secret]):
         st.error("⚠️ Configurează toate serviciile!")
     else:
-        sync_woocommerce_full(woo_url, woo_key, woo_secret)
+        run_store_sync(sync_woocommerce_full, store_id, woo_url, woo_key, woo_secret)
 
 if report:
     if not db_connected or not all([sb_email, sb_token, sb_cif]):
@@ -642,17 +1040,17 @@ if report:
         st.subheader("📊 Generare Raport Discrepanțe")
         
         with st.spinner("📥 Preluare date..."):
-            woo_dict = get_woocommerce_stock_from_db()
-            sb_data = get_smartbill_stocks(sb_email, sb_token, sb_cif, WAREHOUSE_NAME)
+            woo_snapshot = get_woocommerce_stock_from_db(store_id)
+            sb_data = get_smartbill_stocks(sb_email, sb_token, sb_cif, warehouse_name)
         
-        if woo_dict and sb_data:
-            sb_dict = process_smartbill_data(sb_data)
+        if woo_snapshot and sb_data:
+            sb_snapshot = process_smartbill_data(sb_data)
             
             col1, col2 = st.columns(2)
-            col1.metric("Produse WooCommerce (DB)", len(woo_dict))
-            col2.metric("Produse SmartBill", len(sb_dict))
+            col1.metric("Produse WooCommerce (DB)", len(woo_snapshot))
+            col2.metric("Produse SmartBill", len(sb_snapshot))
             
-            df = generate_discrepancy_report(sb_dict, woo_dict)
+            df = generate_discrepancy_report(sb_snapshot, woo_snapshot)
             
             if len(df) > 0:
                 st.markdown("---")